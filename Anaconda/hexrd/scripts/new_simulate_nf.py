@@ -5,16 +5,16 @@ Also trying to minimize imports
 """
 
 import sys
+import math
 import logging
 
 import numpy as np
 import numba
+from numba import cuda
 import yaml
 import argparse
 import time
 import itertools as it
-from contextlib import contextmanager
-import multiprocessing
 # import of hexrd modules
 
 from hexrd import matrixutil as mutil
@@ -25,7 +25,7 @@ from hexrd.xrd import xrdutil
 import hexrd.gridutil as gridutil
 
 from hexrd.xrd import material
-from skimage.morphology import dilation as ski_dilation
+from scipy.ndimage import maximum_filter1d
 
 
 # ==============================================================================
@@ -37,11 +37,10 @@ class ProcessController(object):
     track the results of the process as well as to provide clues of
     the progress of the process"""
 
-    def __init__(self, result_handler=None, progress_observer=None, ncpus = 1,
+    def __init__(self, result_handler=None, progress_observer=None,
                  chunk_size = 100):
         self.rh = result_handler
         self.po = progress_observer
-        self.ncpus = ncpus
         self.chunk_size = chunk_size
         self.limits = {}
         self.timing = []
@@ -91,9 +90,6 @@ class ProcessController(object):
         return value
 
     # configuration  -----------------------------------------------------------
-    def get_process_count(self):
-        return self.ncpus
-
     def get_chunk_size(self):
         return self.chunk_size
 
@@ -218,6 +214,34 @@ def checking_result_handler(filename):
 # ==============================================================================
 # %% UTILITY FUNCTIONS
 # ==============================================================================
+@numba.njit
+def _build_instrument_rmats(detector_params, rMat_d, rMat_s):
+    """detector and (ome = 0) sample rotations from detector_params
+
+    detector_params - (10,) array: tilt angles (3), tVec_d (3), chi, tVec_s (3)
+    rMat_d - (3, 3) array: output detector rotation, rotZ * rotY * rotX
+    rMat_s - (3, 3) array: output sample rotation at ome = 0, i.e. about X by chi
+    """
+    cX = np.cos(detector_params[0]); sX = np.sin(detector_params[0])
+    cY = np.cos(detector_params[1]); sY = np.sin(detector_params[1])
+    cZ = np.cos(detector_params[2]); sZ = np.sin(detector_params[2])
+    cchi = np.cos(detector_params[6]); schi = np.sin(detector_params[6])
+
+    rMat_d[0, 0] =  cZ*cY
+    rMat_d[0, 1] =  cZ*sY*sX - sZ*cX
+    rMat_d[0, 2] =  cZ*sY*cX + sZ*sX
+    rMat_d[1, 0] =  sZ*cY
+    rMat_d[1, 1] =  sZ*sY*sX + cZ*cX
+    rMat_d[1, 2] =  sZ*sY*cX - cZ*sX
+    rMat_d[2, 0] = -sY
+    rMat_d[2, 1] =  cY*sX
+    rMat_d[2, 2] =  cY*cX
+
+    rMat_s[0, 0] = 1.0;  rMat_s[0, 1] = 0.0;   rMat_s[0, 2] = 0.0
+    rMat_s[1, 0] = 0.0;  rMat_s[1, 1] = cchi;  rMat_s[1, 2] = -schi
+    rMat_s[2, 0] = 0.0;  rMat_s[2, 1] = schi;  rMat_s[2, 2] = cchi
+
+
 def mockup_experiment():
     # user options
     # each grain is provided in the form of a quaternion.
@@ -244,13 +268,14 @@ def mockup_experiment():
     crd1 = crd0 + np.r_[0.100, 0.100, 0]
     crds = np.array([crd0, crd1])
 
-    # make grain parameters
-    grain_params = []
-    for i in range(n_grains):
-        for j in range(len(crd0)):
-            grain_params.append(
-                np.hstack([exp_maps[i, :], crds[i][j, :], xf.vInv_ref.flatten()])
-            )
+    # make grain parameters, one contiguous array per parameter kind
+    # (grain i, coordinate j) -> row i*len(crd0) + j
+    exp_maps_all = np.repeat(exp_maps, len(crd0), axis=0)
+    tVec_c_all = crds.reshape(-1, 3)
+    vInv_all = np.tile(xf.vInv_ref.flatten(), (len(tVec_c_all), 1))
+
+    # stacked (n, 12) form for callers working on whole parameter rows
+    grain_params = np.hstack([exp_maps_all, tVec_c_all, vInv_all])
 
     # scan range and period
     ome_period = (0, 2*np.pi)
@@ -271,8 +296,11 @@ def mockup_experiment():
     tVec_d = np.array(instr_cfg['detector']['transform']['t_vec_d']).reshape(3,1)
     chi = instr_cfg['oscillation_stage']['chi']
     tVec_s = np.array(instr_cfg['oscillation_stage']['t_vec_s']).reshape(3,1)
-    rMat_d = xfcapi.makeDetectorRotMat(tiltAngles)
-    rMat_s = xfcapi.makeOscillRotMat([chi, 0.])
+    detector_params = np.hstack([tiltAngles, tVec_d.flatten(), chi,
+                                 tVec_s.flatten()])
+    rMat_d = np.empty((3, 3))
+    rMat_s = np.empty((3, 3))
+    _build_instrument_rmats(detector_params, rMat_d, rMat_s)
 
     pixel_size = instr_cfg['detector']['pixels']['size']
     nrows = instr_cfg['detector']['pixels']['rows']
@@ -297,8 +325,6 @@ def mockup_experiment():
                                     tVec_d, tVec_s, np.zeros(3))
 
     max_pixel_tth = np.amax(gcrds[0][0])
-    detector_params = np.hstack([tiltAngles, tVec_d.flatten(), chi,
-                                 tVec_s.flatten()])
     distortion = None
 
     # a different parametrization for the sensor (makes for faster quantization)
@@ -350,8 +376,7 @@ def mockup_experiment():
     ns.tVec_d = tVec_d
     ns.chi = chi # note this is used to compute S... why is it needed?
     ns.tVec_s = tVec_s
-    # ns.rMat_s = rMat_s
-    # ns.tVec_s = tVec_s
+    ns.rMat_s = rMat_s # sample rotation at ome = 0
     ns.rMat_c = rMat_c
     ns.row_dilation = row_dilation
     ns.col_dilation = col_dilation
@@ -367,11 +392,10 @@ def mockup_experiment():
 # ==============================================================================
 # %% OPTIMIZED BITS
 # ==============================================================================
-@numba.njit
-def _v3_dot(a, b):
-    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
-
-@numba.njit
+# the hot kernels are compiled with cache=True so that runs after the first
+# one load them from __pycache__ (or NUMBA_CACHE_DIR) instead of compiling
+# them again at every process start.
+@numba.njit(inline='always')
 def _m33_v3_multiply(m, v, dst):
     v0 = v[0]; v1 = v[1]; v2 = v[2]
     dst[0] = m[0, 0]*v0 + m[0, 1]*v1 + m[0, 2]*v2
@@ -381,27 +405,11 @@ def _m33_v3_multiply(m, v, dst):
     return dst
 
 
-@numba.njit
-def __anglesToGVec(angs, rMat_ss, rMat_c):
-    result = np.empty_like(angs)
-    tmp_g = np.empty((3,))
-    for i in range(len(angs)):
-        cx = np.cos(0.5*angs[i,0])
-        sx = np.sin(0.5*angs[i,0])
-        cy = np.cos(angs[i,1])
-        sy = np.sin(angs[i,1])
-        tmp_g[0] = cx*cy
-        tmp_g[1] = cx*sy
-        tmp_g[2] = sx
-        np.dot(rMat_c, np.dot(rMat_ss[i], tmp_g), out=result[i])
-
-    return result
-
-@numba.njit
+@numba.njit(parallel=True, fastmath=True, cache=True)
 def _anglesToGVec(angs, rMat_ss, rMat_c):
     """From a set of angles return them in crystal space"""
     result = np.empty_like(angs)
-    for i in range(len(angs)):
+    for i in numba.prange(len(angs)):
         cx = np.cos(0.5*angs[i, 0])
         sx = np.sin(0.5*angs[i, 0])
         cy = np.cos(angs[i,1])
@@ -410,6 +418,8 @@ def _anglesToGVec(angs, rMat_ss, rMat_c):
         g1 = cx*sy
         g2 = sx
 
+        # rMat_c.T * (rMat_ss[i].T * g), right to left so that only
+        # matrix-vector products are formed
         t0_0 = rMat_ss[ i, 0, 0]*g0 + rMat_ss[ i, 1, 0]*g1 + rMat_ss[ i, 2, 0]*g2
         t0_1 = rMat_ss[ i, 0, 1]*g0 + rMat_ss[ i, 1, 1]*g1 + rMat_ss[ i, 2, 1]*g2
         t0_2 = rMat_ss[ i, 0, 2]*g0 + rMat_ss[ i, 1, 2]*g1 + rMat_ss[ i, 2, 2]*g2
@@ -421,18 +431,11 @@ def _anglesToGVec(angs, rMat_ss, rMat_c):
     return result
 
 
-@numba.njit
 def _filter_nans(tmp_xys):
-    result = np.empty_like(tmp_xys)
-
-    pivot = 0
-    for i in range(len(tmp_xys)):
-        if np.isfinite(tmp_xys[i, 0]) and np.isfinite(tmp_xys[i,1]):
-            result[pivot, 0] = tmp_xys[i, 0]
-            result[pivot, 1] = tmp_xys[i, 1]
-            pivot += 1
-
-    return result[0:pivot,:]
+    """drop the rows of an (n, 2) array that have a non-finite coordinate"""
+    # mask first, compact after: no data-dependent branch in the inner loop
+    finite = np.isfinite(tmp_xys[:, 0]) & np.isfinite(tmp_xys[:, 1])
+    return tmp_xys[finite]
 
 
 def _opt_project_on_detector(angs, rD, rC, gVec_cs, rMat_ss, tD, tC, tS, distortion):
@@ -454,9 +457,16 @@ def _opt_project_on_detector(angs, rD, rC, gVec_cs, rMat_ss, tD, tC, tS, distort
 def get_simulate_diffractions(grain_params, experiment,
                               cache_file='gold_cubes.npy',
                               controller=None):
-    """getter functions that handles the caching of the simulation"""
+    """getter functions that handles the caching of the simulation
+
+    a cached stack is memory mapped rather than read, frames are paged in
+    as they are used.
+    """
     try:
-        image_stack = np.load(cache_file)
+        image_stack = np.load(cache_file, mmap_mode='r')
+        if image_stack.dtype == bool:
+            # cache written before the stack was bit-packed
+            image_stack = np.packbits(image_stack, axis=-1)
     except Exception:
         image_stack = simulate_diffractions(grain_params, experiment,
                                             controller=controller)
@@ -467,37 +477,52 @@ def get_simulate_diffractions(grain_params, experiment,
     return image_stack
 
 
-@numba.njit
+@numba.njit(cache=True)
 def _write_pixels(coords, angles, image, base, inv_deltas, clip_vals):
-    count = len(coords)
-    for i in range(count):
-        x = int(np.floor((coords[i, 0] - base[0]) * inv_deltas[0]))
+    """set the pixels hit by coords + angles in image
 
-        if x < 0 or x >= clip_vals[0]:
+    image - (nframes, nrows, (ncols+7)//8) uint8 array: image stack
+            bit-packed along the columns (np.packbits bit order)
+
+    coords rows with nan (gvecs not hitting the detector) are skipped
+    """
+    # visit the hits by increasing angle, i.e. frame by frame, so that
+    # consecutive stores land in the same frame
+    order = np.argsort(angles)
+    for i in order:
+        xf = np.floor((coords[i, 0] - base[0]) * inv_deltas[0])
+
+        if not (xf >= 0.0 and xf < clip_vals[0]):
             continue
 
-        y = int(np.floor((coords[i, 1] - base[1]) * inv_deltas[1]))
+        yf = np.floor((coords[i, 1] - base[1]) * inv_deltas[1])
 
-        if y < 0 or y >= clip_vals[1]:
+        if not (yf >= 0.0 and yf < clip_vals[1]):
             continue
 
+        x = int(xf)
+        y = int(yf)
         z = int(np.floor((angles[i] - base[2]) * inv_deltas[2]))
 
-        image[z, y, x] = True
+        image[z, y, x >> 3] |= 0x80 >> (x & 7)
+
 
+# number of (grain, angle) rows simulate_diffractions projects and writes at
+# once; its working set is a few tens of bytes per row whatever the grain count
+SIMULATE_CHUNK_ROWS = 1 << 20
 
 def simulate_diffractions(grain_params, experiment, controller):
     """actual forward simulation of the diffraction"""
 
-    image_stack = np.zeros((experiment.nframes, experiment.nrows, experiment.ncols), dtype=bool)
+    image_stack = np.zeros((experiment.nframes, experiment.nrows,
+                            (experiment.ncols + 7)//8), dtype=np.uint8)
     count = len(grain_params)
     subprocess = 'simulate diffractions'
 
-    _project = xrdutil._project_on_detector_plane
     rD = experiment.rMat_d
     chi = experiment.chi
-    tD = experiment.tVec_d
-    tS = experiment.tVec_s
+    tD = experiment.tVec_d[:, 0]
+    tS = experiment.tVec_s[:, 0]
     distortion = experiment.distortion
 
     eta_range = [(-np.pi, np.pi), ]
@@ -508,27 +533,72 @@ def simulate_diffractions(grain_params, experiment, controller):
     bMat = experiment.plane_data.latVecOps['B']
     wlen = experiment.plane_data.wavelength
 
-    controller.start(subprocess, count)
+    # split the parameter rows once into contiguous per-kind arrays
+    grain_params = np.atleast_2d(grain_params)
+    rCn = xf.makeRotMatOfExpMapArray(grain_params[:, 0:3])
+    tCn = np.ascontiguousarray(grain_params[:, 3:6])
+    vInv_sn = np.ascontiguousarray(grain_params[:, 6:12])
+
+    # loop scratch: the hkls in the contiguous layout the CAPI wants, and the
+    # stacked (ome0, ome1) solutions. The filtering below copies the rows it
+    # keeps, so ang_list can be overwritten on the next grain
+    hkls = np.ascontiguousarray(full_hkls[:, 1:])
+    ang_list = np.empty((2*len(hkls), 3))
+
+    # the diffraction angles only depend on orientation and stretch, grains
+    # sharing both (common in mocked up experiments) reuse them. So does the
+    # orientation-only part of the projection: the gvecs are taken in the
+    # sample frame, so the crystal rotation is the identity and only the
+    # grain position differs between the grains of a key
+    precomp_cache = {}
+    grains_of_key = {}
     for i in range(count):
-        rC = xfcapi.makeRotMatOfExpMap(grain_params[i][0:3])
-        tC = np.ascontiguousarray(grain_params[i][3:6])
-        vInv_s = np.ascontiguousarray(grain_params[i][6:12])
-        ang_list = np.vstack(xfcapi.oscillAnglesOfHKLs(full_hkls[:, 1:], chi,
-                                                       rC, bMat, wlen,
-                                                       vInv=vInv_s))
+        rC = rCn[i]
+        vInv_s = vInv_sn[i]
+        key = (rC.tobytes(), vInv_s.tobytes())
+        if key in grains_of_key:
+            grains_of_key[key].append(i)
+            continue
+        grains_of_key[key] = [i]
+
+        np.concatenate(xfcapi.oscillAnglesOfHKLs(hkls, chi, rC, bMat, wlen,
+                                                 vInv=vInv_s),
+                       out=ang_list)
         # hkls not needed here
         all_angs, _ = xrdutil._filter_hkls_eta_ome(full_hkls, ang_list,
                                                    eta_range, ome_range)
         all_angs[:, 2] =xf.mapAngle(all_angs[:, 2], ome_period)
-
-
-        det_xy, _ = _project(all_angs, rD, rC, chi, tD,
-                             tC, tS, distortion)
-
-        _write_pixels(det_xy, all_angs[:,2], image_stack, experiment.base,
-                      experiment.inv_deltas, experiment.clip_vals)
-
-        controller.update(i+1)
+        rMat_ss = xfcapi.makeOscillRotMatArray(chi, all_angs[:, 2])
+        gvec_ss = _anglesToGVec(all_angs, rMat_ss, I3)
+        precomp_cache[key] = ((all_angs[:, 2].copy(), rMat_ss) +
+                              _gvec_to_detector_precomp(gvec_ss, rD, rMat_ss,
+                                                        I3))
+
+    # project and write the grains of a key in chunks of at most
+    # SIMULATE_CHUNK_ROWS hits, so the working set does not grow with count
+    controller.start(subprocess, count)
+    done = 0
+    for key, grains in grains_of_key.items():
+        omes, rMat_ss, tD_ln, denom, valid = precomp_cache[key]
+        n_angs = len(omes)
+        step = max(1, SIMULATE_CHUNK_ROWS // max(n_angs, 1))
+        det_xy = np.empty((min(step, len(grains)), n_angs, 2))
+        for lo in range(0, len(grains), step):
+            tCs = tCn[grains[lo:lo + step]]
+            n_grains = len(tCs)
+            _project_coords(rMat_ss, tD_ln, denom, valid, tCs, rD, tD, tS,
+                            0, n_grains, det_xy)
+            hits = det_xy[:n_grains]
+            if distortion is not None and len(distortion) > 0:
+                xys = distortion[0](hits[:, valid].reshape(-1, 2),
+                                    distortion[1], invert=True)
+                hits[:, valid] = xys.reshape(n_grains, -1, 2)
+
+            _write_pixels(hits.reshape(-1, 2), np.tile(omes, n_grains),
+                          image_stack, experiment.base,
+                          experiment.inv_deltas, experiment.clip_vals)
+            done += n_grains
+            controller.update(done)
 
     controller.finish(subprocess)
     return image_stack
@@ -539,7 +609,44 @@ def simulate_diffractions(grain_params, experiment, controller):
 # ==============================================================================
 
 
+def _dilate_image_stack(image_stack, experiment, controller):
+    """grow every frame of the (bit-packed) image_stack by the row/col
+    dilation of experiment
+
+    a lookup in the result is equivalent to searching the dilation window
+    around the pixel in image_stack. The result is bit-packed along the
+    columns (np.packbits, 8 columns per byte) to cut the memory traffic of
+    the random lookups by 8; read it with _packed_pixel.
+    """
+    subprocess = 'dilate image_stack'
+
+    # the structuring element is a full rectangle, so the dilation is
+    # separable: a max filter along the rows followed by one along the
+    # columns, O(dr + dc) per pixel instead of O(dr * dc)
+    # the dilations come from np.ceil, maximum_filter1d wants int sizes
+    row_size = int(2*experiment.row_dilation + 1)
+    col_size = int(2*experiment.col_dilation + 1)
+    n_images, nrows, ncols = len(image_stack), experiment.nrows, experiment.ncols
+    image_stack_dilated = np.empty((n_images, nrows, (ncols + 7)//8),
+                                   dtype=np.uint8)
+    frame_rows = np.empty((nrows, ncols), dtype=np.uint8)
+    frame_dilated = np.empty((nrows, ncols), dtype=np.uint8)
+    controller.start(subprocess, n_images)
+    for i_image in range(n_images):
+        frame = np.unpackbits(image_stack[i_image], axis=-1)[:, :ncols]
+        maximum_filter1d(frame, row_size, axis=0, output=frame_rows)
+        maximum_filter1d(frame_rows, col_size, axis=1, output=frame_dilated)
+        image_stack_dilated[i_image] = np.packbits(frame_dilated, axis=-1)
+        controller.update(i_image+1)
+    controller.finish(subprocess)
+
+    return image_stack_dilated
+
+
 def _grand_loop(image_stack, all_angles, test_crds, experiment, controller):
+    """reference grand loop, projecting with the (non numba) hexrd code"""
+    image_stack_dilated = _dilate_image_stack(image_stack, experiment,
+                                              controller)
     n_grains = experiment.n_grains
     n_coords = controller.limit('coords', len(test_crds))
 
@@ -567,20 +674,16 @@ def _grand_loop(image_stack, all_angles, test_crds, experiment, controller):
             col_indices = indices[:, 0]
             row_indices = indices[:, 1]
             frame_indices = indices[:, 2]
-            confidence[igrn, icrd] = _confidence_check(image_stack,
-                                                       frame_indices,
-                                                       row_indices,
-                                                       col_indices,
-                                                       experiment.row_dilation,
-                                                       experiment.col_dilation,
-                                                       experiment.nrows,
-                                                       experiment.ncols)
+            confidence[igrn, icrd] = _confidence_check_dilated(image_stack_dilated,
+                                                               frame_indices,
+                                                               row_indices,
+                                                               col_indices)
         controller.update(icrd*n_grains)
     controller.finish(subprocess)
     controller.handle_result("confidence", confidence)
 
 
-@numba.njit
+@numba.njit(inline='always')
 def _v3_normalized(src, dst):
     v0 = src[0]
     v1 = src[1]
@@ -594,202 +697,457 @@ def _v3_normalized(src, dst):
 
     return dst
 
-@numba.njit
-def _make_binary_rot_mat(src, dst):
-    v0 = src[0]; v1 = src[1]; v2 = src[2]
-
-    dst[0,0] = 2.0*v0*v0 - 1.0
-    dst[0,1] = 2.0*v0*v1
-    dst[0,2] = 2.0*v0*v2
-    dst[1,0] = 2.0*v1*v0
-    dst[1,1] = 2.0*v1*v1 - 1.0
-    dst[1,2] = 2.0*v1*v2
-    dst[2,0] = 2.0*v2*v0
-    dst[2,1] = 2.0*v2*v1
-    dst[2,2] = 2.0*v2*v2 - 1.0
-
-    return dst
-
 
 # tC varies per coord
 # gvec_cs, rSm varies per grain
 #
-# gvec_cs
+# everything that does not depend on tC is computed once per grain by
+# _gvec_to_detector_precomp, leaving a matvec and a few dot products per
+# gvec for each coord in _precomp_to_detector_array
 beam = xf.bVec_ref[:, 0]
 Z_l = xf.Zl[:,0]
-@numba.jit()
-def _gvec_to_detector_array(vG_sn, rD, rSn, rC, tD, tS, tC):
-    """ beamVec is the beam vector: (0, 0, -1) in this case """
+I3 = np.eye(3)
+@numba.njit(fastmath=True, boundscheck=False, cache=True)
+def _gvec_to_detector_precomp(vG_sn, rD, rSn, rC):
+    """ beamVec is the beam vector: (0, 0, -1) in this case
+
+    vG_sn - (N, 3) array: gvecs in crystal frame, one per sample rotation
+    rSn - (N, 3, 3) array: sample rotations
+    returns tD_ln, a (N, 3) array with the diffracted beam directions in the
+    lab frame, denom, a (N,) array with their projections on the detector
+    normal, and valid, a (N,) bool array that is False for the gvecs that do
+    not diffract onto the detector plane
+    """
     ztol = xrdutil.epsf
-    p3_l = np.empty((3,))
-    tmp_vec = np.empty((3,))
-    vG_l = np.empty((3,))
-    tD_l = np.empty((3,))
-    norm_vG_s = np.empty((3,))
     norm_beam = np.empty((3,))
     tZ_l = np.empty((3,))
-    brMat = np.empty((3,3))
-    result = np.empty((len(rSn), 2))
+    n = len(rSn)
+    tD_ln = np.empty((n, 3))
+    denom = np.empty((n,))
+    valid = np.empty((n,), dtype=np.bool_)
 
     _v3_normalized(beam, norm_beam)
     _m33_v3_multiply(rD, Z_l, tZ_l)
+    nb0 = norm_beam[0]; nb1 = norm_beam[1]; nb2 = norm_beam[2]
+    tZ0 = tZ_l[0]; tZ1 = tZ_l[1]; tZ2 = tZ_l[2]
+
+    for i in range(n):
+        rS = rSn[i]
+
+        # vG_l = rS * rC * normalized(vG_sn[i])
+        g0 = vG_sn[i, 0]; g1 = vG_sn[i, 1]; g2 = vG_sn[i, 2]
+        sqr_norm = g0*g0 + g1*g1 + g2*g2
+        inv_norm = 1.0 if sqr_norm == 0.0 else 1./np.sqrt(sqr_norm)
+        g0 *= inv_norm; g1 *= inv_norm; g2 *= inv_norm
+        c0 = rC[0, 0]*g0 + rC[0, 1]*g1 + rC[0, 2]*g2
+        c1 = rC[1, 0]*g0 + rC[1, 1]*g1 + rC[1, 2]*g2
+        c2 = rC[2, 0]*g0 + rC[2, 1]*g1 + rC[2, 2]*g2
+        l0 = rS[0, 0]*c0 + rS[0, 1]*c1 + rS[0, 2]*c2
+        l1 = rS[1, 0]*c0 + rS[1, 1]*c1 + rS[1, 2]*c2
+        l2 = rS[2, 0]*c0 + rS[2, 1]*c1 + rS[2, 2]*c2
+
+        bDot = -(nb0*l0 + nb1*l1 + nb2*l2)
+
+        # tD_l = (2 vG_l vG_l^T - I) * norm_beam, with vG_l . norm_beam = -bDot
+        t0 = -2.0*bDot*l0 - nb0
+        t1 = -2.0*bDot*l1 - nb1
+        t2 = -2.0*bDot*l2 - nb2
+        d = tZ0*t0 + tZ1*t1 + tZ2*t2
+
+        tD_ln[i, 0] = t0
+        tD_ln[i, 1] = t1
+        tD_ln[i, 2] = t2
+        denom[i] = d
+        valid[i] = not (bDot < ztol or bDot > 1.0 - ztol or d < ztol)
+
+    return tD_ln, denom, valid
+
+
+@numba.njit(fastmath=True, boundscheck=False, cache=True)
+def _precomp_to_detector_array(rSn, tD_ln, denom, valid, rD, tD, tS, tC,
+                               result):
+    """detector coordinates of the gvecs precomputed by
+    _gvec_to_detector_precomp for a grain at position tC
+
+    result - (N, 2) array: output detector coordinates (nan where the gvec
+             is not valid)
+    """
 
-    for i in xrange(len(rSn)):
-        _m33_v3_multiply(rSn[i], tC, p3_l)
-        p3_l += tS
-        p3_minus_p1_l = tD - p3_l
+    tZ0 = rD[0, 0]*Z_l[0] + rD[0, 1]*Z_l[1] + rD[0, 2]*Z_l[2]
+    tZ1 = rD[1, 0]*Z_l[0] + rD[1, 1]*Z_l[1] + rD[1, 2]*Z_l[2]
+    tZ2 = rD[2, 0]*Z_l[0] + rD[2, 1]*Z_l[1] + rD[2, 2]*Z_l[2]
+    tC0 = tC[0]; tC1 = tC[1]; tC2 = tC[2]
 
-        num = _v3_dot(tZ_l, p3_minus_p1_l)
-        _v3_normalized(vG_sn[i], norm_vG_s)
+    for i in range(len(rSn)):
+        if not valid[i]:
+            result[i, 0] = np.nan
+            result[i, 1] = np.nan
+            continue
 
-        _m33_v3_multiply(rC, norm_vG_s, tmp_vec)
-        _m33_v3_multiply(rSn[i], tmp_vec, vG_l)
+        rS = rSn[i]
 
-        bDot = -_v3_dot(norm_beam, vG_l)
+        # p3_l = rS * tC + tS; d = tD - p3_l
+        d0 = tD[0] - (rS[0, 0]*tC0 + rS[0, 1]*tC1 + rS[0, 2]*tC2 + tS[0])
+        d1 = tD[1] - (rS[1, 0]*tC0 + rS[1, 1]*tC1 + rS[1, 2]*tC2 + tS[1])
+        d2 = tD[2] - (rS[2, 0]*tC0 + rS[2, 1]*tC1 + rS[2, 2]*tC2 + tS[2])
 
-        if bDot < ztol or bDot > 1.0 - ztol:
-            result[i, 0] = np.nan
-            result[i, 1] = np.nan
+        u = (tZ0*d0 + tZ1*d1 + tZ2*d2)/denom[i]
+        r0 = u*tD_ln[i, 0] - d0
+        r1 = u*tD_ln[i, 1] - d1
+        r2 = u*tD_ln[i, 2] - d2
+        result[i, 0] = r0*rD[0, 0] + r1*rD[1, 0] + r2*rD[2, 0]
+        result[i, 1] = r0*rD[0, 1] + r1*rD[1, 1] + r2*rD[2, 1]
+
+    return result
+
+
+@numba.njit(fastmath=True, boundscheck=False)
+def _gvec_to_detector_array(vG_sn, rD, rSn, rC, tD, tS, tC):
+    """ beamVec is the beam vector: (0, 0, -1) in this case
+
+    vG_sn - (N, 3) array: gvecs in crystal frame, one per sample rotation
+    rSn - (N, 3, 3) array: sample rotations
+    returns a (N, 2) array with the detector coordinates (nan if the gvec
+    does not diffract onto the detector plane)
+    """
+    tD_ln, denom, valid = _gvec_to_detector_precomp(vG_sn, rD, rSn, rC)
+    return _precomp_to_detector_array(rSn, tD_ln, denom, valid,
+                                      rD, tD, tS, tC,
+                                      np.empty((len(rSn), 2)))
+
+
+@numba.njit(parallel=True, fastmath=True, cache=True)
+def _project_coords(rSn, tD_ln, denom, valid, coords, rD, tD, tS,
+                    start, stop, det_xy):
+    """detector coordinates of a grain's precomputed gvecs for the grain
+    positions coords[start:stop]
+
+    det_xy - (>= stop-start, >= N, 2) array: scratch receiving the
+             coordinates, det_xy[icrd-start, :N] for coords[icrd]
+    """
+    n = len(rSn)
+    for icrd in numba.prange(start, stop):
+        _precomp_to_detector_array(rSn, tD_ln, denom, valid, rD, tD, tS,
+                                   coords[icrd], det_xy[icrd - start, :n])
+
+@numba.njit(fastmath=True, cache=True)
+def _project_quant_confidence(rSn, tD_ln, denom, valid, omes, tC, rD, tD, tS,
+                              base, inv_deltas, clip_vals, image):
+    """confidence of a grain at position tC, fusing _precomp_to_detector_array
+    and _quant_and_clip_confidence_numba
+
+    each gvec is projected, quantized, clipped and looked up in the
+    bit-packed image in turn, so no detector coordinates are stored.
+    Invalid gvecs are skipped before projecting, so no nans are involved.
+    """
+    tZ0 = rD[0, 0]*Z_l[0] + rD[0, 1]*Z_l[1] + rD[0, 2]*Z_l[2]
+    tZ1 = rD[1, 0]*Z_l[0] + rD[1, 1]*Z_l[1] + rD[1, 2]*Z_l[2]
+    tZ2 = rD[2, 0]*Z_l[0] + rD[2, 1]*Z_l[1] + rD[2, 2]*Z_l[2]
+    tC0 = tC[0]; tC1 = tC[1]; tC2 = tC[2]
+
+    in_sensor = 0
+    matches = 0
+    for i in range(len(rSn)):
+        if not valid[i]:
             continue
 
-        _make_binary_rot_mat(vG_l, brMat)
-        _m33_v3_multiply(brMat, norm_beam, tD_l)
-        denom = _v3_dot(tZ_l, tD_l)
+        rS = rSn[i]
+        d0 = tD[0] - (rS[0, 0]*tC0 + rS[0, 1]*tC1 + rS[0, 2]*tC2 + tS[0])
+        d1 = tD[1] - (rS[1, 0]*tC0 + rS[1, 1]*tC1 + rS[1, 2]*tC2 + tS[1])
+        d2 = tD[2] - (rS[2, 0]*tC0 + rS[2, 1]*tC1 + rS[2, 2]*tC2 + tS[2])
 
-        if denom < ztol:
-            result[i, 0] = np.nan
-            result[i, 1] = np.nan
+        u = (tZ0*d0 + tZ1*d1 + tZ2*d2)/denom[i]
+        r0 = u*tD_ln[i, 0] - d0
+        r1 = u*tD_ln[i, 1] - d1
+        r2 = u*tD_ln[i, 2] - d2
+
+        xf = r0*rD[0, 0] + r1*rD[1, 0] + r2*rD[2, 0]
+        xf = np.floor((xf - base[0]) * inv_deltas[0])
+        if not (xf >= 0.0 and xf < clip_vals[0]):
             continue
 
-        u = num/denom
-        tmp_res = u*tD_l - p3_minus_p1_l
-        result[i,0] = _v3_dot(tmp_res, rD[:,0])
-        result[i,1] = _v3_dot(tmp_res, rD[:,1])
+        yf = r0*rD[0, 1] + r1*rD[1, 1] + r2*rD[2, 1]
+        yf = np.floor((yf - base[1]) * inv_deltas[1])
+        if not (yf >= 0.0 and yf < clip_vals[1]):
+            continue
 
-    return result
+        zf = np.floor((omes[i] - base[2]) * inv_deltas[2])
 
-def _grand_loop_inner(confidence, image_stack, angles, precomp, coords,
-                      experiment, start=0, stop=None):
-    n_coords = len(coords)
-    n_angles = len(angles)
-    rD = experiment.rMat_d
-    rCn = experiment.rMat_c
-    tD = experiment.tVec_d[:,0]
-    tS = experiment.tVec_s[:,0]
-    distortion = experiment.distortion
-    _to_detector = xfcapi.gvecToDetectorXYArray
-    #_to_detector = _gvec_to_detector_array
-    stop = stop if stop is not None else n_coords
+        in_sensor += 1
+        matches += _packed_pixel(image, int(zf), int(yf), int(xf))
 
-    distortion_fn = None
-    if distortion is not None and len(distortion > 0):
-        distortion_fn, distortion_args = distortion
+    return 0 if in_sensor == 0 else float(matches)/float(in_sensor)
 
-    if distortion_fn is None:
-        for igrn in xrange(n_angles):
-            angs = angles[igrn]; rC = rCn[igrn]; gvec_cs, rMat_ss = precomp[igrn]
-            for icrd in xrange(start, stop):
-                det_xy = _to_detector(gvec_cs, rD, rMat_ss, rC, tD, tS, coords[icrd])
-                c = _quant_and_clip_confidence(det_xy, angs[:,2],
-                                               image_stack, experiment.base,
-                                               experiment.inv_deltas,
-                                               experiment.clip_vals)
-                confidence[igrn, icrd] = c
+
+# coords per tile of the grand loop. Each thread takes a tile of
+# neighbouring coords and runs every grain over the whole tile, so a grain's
+# precomputed arrays are reused COORD_TILE times while in cache and the
+# lookups of consecutive coords land in nearby image pixels. Kept small so
+# that a default chunk of coords still splits into enough tiles for the
+# threads.
+COORD_TILE = 16
+
+@numba.njit(parallel=True, nogil=True, cache=True)
+def _grand_loop_inner_numba(confidence, image_stack, n_hkls, omes, rMat_ss,
+                            tD_ln, denom, valid, coords,
+                            rD, tD, tS, base, inv_deltas, clip_vals,
+                            start, stop):
+    """confidence of every grain at the coords in [start, stop)
+
+    the per-grain arrays are the padded ones built by _grand_loop_precomp.
+    The coords are split in tiles of COORD_TILE among the numba threads.
+    Writes to confidence are disjoint.
+    """
+    n_grains = len(n_hkls)
+    n_tiles = (stop - start + COORD_TILE - 1) // COORD_TILE
+    for itile in numba.prange(n_tiles):
+        tile_start = start + itile*COORD_TILE
+        tile_stop = min(tile_start + COORD_TILE, stop)
+        for igrn in range(n_grains):
+            n = n_hkls[igrn]
+            for icrd in range(tile_start, tile_stop):
+                confidence[igrn, icrd] = _project_quant_confidence(
+                    rMat_ss[igrn, :n], tD_ln[igrn, :n], denom[igrn, :n],
+                    valid[igrn, :n], omes[igrn, :n], coords[icrd],
+                    rD, tD, tS, base, inv_deltas, clip_vals, image_stack)
+
+
+# the grand loop runs on the GPU when one is usable through numba.cuda
+# (distortion-free experiments only). Set to False to stay on the CPU.
+GRAND_LOOP_USE_CUDA = cuda.is_available()
+
+@cuda.jit
+def _grand_loop_cuda_kernel(confidence, image_stack, n_hkls, omes, rMat_ss,
+                            tD_ln, denom, valid, coords,
+                            rD, tZ_l, tD, tS, base, inv_deltas, clip_vals,
+                            start, stop):
+    """CUDA version of _grand_loop_inner_numba, one thread per
+    (coord, grain) pair, coords[start + x] and grain y of the grid
+
+    same math as _project_quant_confidence; tZ_l is rD * Z_l
+    """
+    icrd, igrn = cuda.grid(2)
+    icrd += start
+    if icrd >= stop or igrn >= len(n_hkls):
+        return
+
+    tC0 = coords[icrd, 0]; tC1 = coords[icrd, 1]; tC2 = coords[icrd, 2]
+
+    in_sensor = 0
+    matches = 0
+    for i in range(n_hkls[igrn]):
+        if not valid[igrn, i]:
+            continue
+
+        d0 = tD[0] - (rMat_ss[igrn, i, 0, 0]*tC0 + rMat_ss[igrn, i, 0, 1]*tC1 +
+                      rMat_ss[igrn, i, 0, 2]*tC2 + tS[0])
+        d1 = tD[1] - (rMat_ss[igrn, i, 1, 0]*tC0 + rMat_ss[igrn, i, 1, 1]*tC1 +
+                      rMat_ss[igrn, i, 1, 2]*tC2 + tS[1])
+        d2 = tD[2] - (rMat_ss[igrn, i, 2, 0]*tC0 + rMat_ss[igrn, i, 2, 1]*tC1 +
+                      rMat_ss[igrn, i, 2, 2]*tC2 + tS[2])
+
+        u = (tZ_l[0]*d0 + tZ_l[1]*d1 + tZ_l[2]*d2)/denom[igrn, i]
+        r0 = u*tD_ln[igrn, i, 0] - d0
+        r1 = u*tD_ln[igrn, i, 1] - d1
+        r2 = u*tD_ln[igrn, i, 2] - d2
+
+        xf = r0*rD[0, 0] + r1*rD[1, 0] + r2*rD[2, 0]
+        xf = math.floor((xf - base[0]) * inv_deltas[0])
+        if not (xf >= 0.0 and xf < clip_vals[0]):
+            continue
+
+        yf = r0*rD[0, 1] + r1*rD[1, 1] + r2*rD[2, 1]
+        yf = math.floor((yf - base[1]) * inv_deltas[1])
+        if not (yf >= 0.0 and yf < clip_vals[1]):
+            continue
+
+        x = int(xf)
+        y = int(yf)
+        z = int(math.floor((omes[igrn, i] - base[2]) * inv_deltas[2]))
+
+        in_sensor += 1
+        matches += (image_stack[z, y, x >> 3] >> (7 - (x & 7))) & 1
+
+    if in_sensor == 0:
+        confidence[igrn, icrd] = 0.0
     else:
-        for igrn in xrange(n_angles):
-            angs = angles[igrn]; rC = rCn[igrn]; gvec_cs, rMat_ss = precomp[igrn]
+        confidence[igrn, icrd] = float(matches)/float(in_sensor)
+
+
+# threads per block of _grand_loop_cuda_kernel, (coords, grains)
+CUDA_BLOCK = (32, 4)
+
+def _grand_loop_inner_cuda(d_confidence, d_image_stack, d_precomp, d_coords,
+                           d_consts, start, stop):
+    """launch _grand_loop_cuda_kernel for the coords in [start, stop)
+
+    all the arrays are device arrays; d_consts holds (rD, tZ_l, tD, tS,
+    base, inv_deltas, clip_vals)
+    """
+    n_grains = d_confidence.shape[0]
+    grid = ((stop - start + CUDA_BLOCK[0] - 1) // CUDA_BLOCK[0],
+            (n_grains + CUDA_BLOCK[1] - 1) // CUDA_BLOCK[1])
+    _grand_loop_cuda_kernel[grid, CUDA_BLOCK](d_confidence, d_image_stack,
+                                              *(d_precomp + (d_coords,) +
+                                                d_consts + (start, stop)))
+    cuda.synchronize()
+
+    return stop - start
+
+
+def _grand_loop_inner_plain(confidence, image_stack, precomp, coords,
+                            experiment, start=0, stop=None):
+    """grand loop over coords[start:stop] for experiments without
+    distortion, all in _grand_loop_inner_numba"""
+    n_hkls, omes, rMat_ss, tD_ln, denom, valid = precomp
+    stop = stop if stop is not None else len(coords)
+
+    _grand_loop_inner_numba(confidence, image_stack, n_hkls, omes,
+                            rMat_ss, tD_ln, denom, valid,
+                            coords, experiment.rMat_d,
+                            experiment.tVec_d[:,0], experiment.tVec_s[:,0],
+                            experiment.base, experiment.inv_deltas,
+                            experiment.clip_vals, start, stop)
+    return stop - start
+
+
+def _make_distorted_kernel(distortion_fn, distortion_args):
+    """build the grand loop inner function for a distortion
+
+    distortion_fn is a python callable, so it can't be compiled into the
+    numba kernel. The returned function projects a grain for the whole
+    chunk of coords and runs the distortion once over all of them, instead
+    of once per (grain, coord).
+    """
+    def _grand_loop_inner_distorted(confidence, image_stack, precomp, coords,
+                                    experiment, start=0, stop=None):
+        n_hkls, omes, rMat_ss, tD_ln, denom, valid = precomp
+        rD = experiment.rMat_d
+        tD = experiment.tVec_d[:,0]
+        tS = experiment.tVec_s[:,0]
+        stop = stop if stop is not None else len(coords)
+        m = stop - start
+
+        det_xy = np.empty((m, rMat_ss.shape[1], 2))
+        for igrn in xrange(len(n_hkls)):
+            n = n_hkls[igrn]
+            _project_coords(rMat_ss[igrn, :n], tD_ln[igrn, :n],
+                            denom[igrn, :n], valid[igrn, :n],
+                            coords, rD, tD, tS, start, stop, det_xy)
+            xys = distortion_fn(det_xy[:m, :n].reshape(-1, 2),
+                                distortion_args, invert=True)
+            xys = xys.reshape(m, n, 2)
             for icrd in xrange(start, stop):
-                det_xy = _to_detector(gvec_cs, rD, rMat_ss, rC, tD, tS, coords[icrd])
-                det_xy = distortion_fn(tmp_xys, distortion_args, invert=True)
-                c = _quant_and_clip_confidence(det_xy, angs[:,2],
+                c = _quant_and_clip_confidence(xys[icrd - start],
+                                               omes[igrn, :n],
                                                image_stack, experiment.base,
                                                experiment.inv_deltas,
                                                experiment.clip_vals)
                 confidence[igrn, icrd] = c
 
-    return stop - start
+        return m
+
+    return _grand_loop_inner_distorted
+
 
 def _grand_loop_precomp(image_stack, all_angles, test_crds, experiment, controller):
     """grand loop precomputing the grown image stack"""
-    subprocess = 'dilate image_stack'
-
-    dilation_shape = np.ones((2*experiment.row_dilation + 1,
-                              2*experiment.col_dilation + 1),
-                             dtype=np.uint8)
-    image_stack_dilated = np.empty_like(image_stack)
-    n_images = len(image_stack)
-    controller.start(subprocess, n_images)
-    for i_image in range(n_images):
-        ski_dilation(image_stack[i_image], dilation_shape, out=image_stack_dilated[i_image])
-        controller.update(i_image+1)
-    controller.finish(subprocess)
+    image_stack_dilated = _dilate_image_stack(image_stack, experiment,
+                                              controller)
 
     n_grains = experiment.n_grains
     n_coords = controller.limit('coords', len(test_crds))
-    _project = xrdutil._project_on_detector_plane
     chunk_size = controller.get_chunk_size()
-    ncpus = controller.get_process_count()
 
-    # precompute per-grain stuff
+    # precompute per-grain stuff. Stored as contiguous arrays over
+    # (grain, hkl), padded to the largest hkl count; rows past n_hkls[i]
+    # are never read
     subprocess = 'precompute gVec_cs'
     controller.start(subprocess, len(all_angles))
-    gvec_cs_precomp = []
+    n_hkls = np.array([len(angs) for angs in all_angles], dtype=np.intp)
+    max_n = n_hkls.max()
+    omes = np.zeros((len(all_angles), max_n))
+    rMat_ss_all = np.zeros((len(all_angles), max_n, 3, 3))
+    tD_ln_all = np.zeros((len(all_angles), max_n, 3))
+    denom_all = np.ones((len(all_angles), max_n))
+    valid_all = np.zeros((len(all_angles), max_n), dtype=bool)
     for i, angs in enumerate(all_angles):
+        n = n_hkls[i]
         rMat_ss = xfcapi.makeOscillRotMatArray(experiment.chi, angs[:,2])
         gvec_cs = _anglesToGVec(angs, rMat_ss, experiment.rMat_c[i])
-        gvec_cs_precomp.append((gvec_cs, rMat_ss))
+        tD_ln, denom, valid = _gvec_to_detector_precomp(gvec_cs,
+                                                        experiment.rMat_d,
+                                                        rMat_ss,
+                                                        experiment.rMat_c[i])
+        omes[i, :n] = angs[:, 2]
+        rMat_ss_all[i, :n] = rMat_ss
+        tD_ln_all[i, :n] = tD_ln
+        denom_all[i, :n] = denom
+        valid_all[i, :n] = valid
+    gvec_cs_precomp = (n_hkls, omes, rMat_ss_all, tD_ln_all, denom_all,
+                       valid_all)
     controller.finish(subprocess)
 
-    # split on coords
-    chunks = xrange(0, n_coords, chunk_size)
+    # the coords inside a chunk are run in parallel by the numba threads
+    # (see NUMBA_NUM_THREADS) or the GPU; chunking is kept only for progress
+    # reporting
     subprocess = 'grand_loop'
     controller.start(subprocess, n_coords)
     finished = 0
-    ncpus = min(ncpus, len(chunks))
-
-    if ncpus > 1:
-        shared_arr = multiprocessing.Array('d', n_grains * n_coords)
-        confidence = np.ctypeslib.as_array(shared_arr.get_obj()).reshape(n_grains, n_coords)
-        with multiproc_state(chunk_size, confidence, image_stack_dilated, all_angles,
-                             gvec_cs_precomp, test_crds, experiment):
-            pool = multiprocessing.Pool(ncpus)
-            for count in pool.imap_unordered(multiproc_inner_loop, chunks):
-                finished += count
-                controller.update(finished)
-            del pool
+    confidence = np.empty((n_grains, n_coords))
+    # pick the inner loop once for the whole run
+    distortion = experiment.distortion
+    if distortion is not None and len(distortion) > 0:
+        inner = _make_distorted_kernel(*distortion)
     else:
-        confidence = np.empty((n_grains, n_coords))
-        for chunk_start in chunks:
-            chunk_stop = min(n_coords, chunk_start+chunk_size)
-            count =_grand_loop_inner(confidence, image_stack_dilated,
-                                     all_angles, gvec_cs_precomp, test_crds,
-                                     experiment, start=chunk_start,
-                                     stop=chunk_stop)
-            finished += count
-            controller.update(finished)
+        inner = _grand_loop_inner_plain
+    use_cuda = GRAND_LOOP_USE_CUDA and inner is _grand_loop_inner_plain
+    if use_cuda:
+        # everything is moved to the device once, confidence comes back at
+        # the end
+        rD = experiment.rMat_d
+        consts = (rD, np.dot(rD, Z_l), experiment.tVec_d[:, 0],
+                  experiment.tVec_s[:, 0], experiment.base,
+                  experiment.inv_deltas, experiment.clip_vals)
+        d_consts = tuple(cuda.to_device(np.ascontiguousarray(a))
+                         for a in consts)
+        d_precomp = tuple(cuda.to_device(a) for a in gvec_cs_precomp)
+        d_image_stack = cuda.to_device(image_stack_dilated)
+        d_coords = cuda.to_device(np.ascontiguousarray(test_crds[:n_coords]))
+        d_confidence = cuda.device_array((n_grains, n_coords))
+    for chunk_start in xrange(0, n_coords, chunk_size):
+        chunk_stop = min(n_coords, chunk_start+chunk_size)
+        if use_cuda:
+            count = _grand_loop_inner_cuda(d_confidence, d_image_stack,
+                                           d_precomp, d_coords, d_consts,
+                                           chunk_start, chunk_stop)
+        else:
+            count = inner(confidence, image_stack_dilated,
+                          gvec_cs_precomp, test_crds, experiment,
+                          start=chunk_start, stop=chunk_stop)
+        finished += count
+        controller.update(finished)
+    if use_cuda:
+        d_confidence.copy_to_host(confidence)
 
     controller.finish(subprocess)
     controller.handle_result("confidence", confidence)
 
 
-def multiproc_inner_loop(chunk):
-    chunk_size = _mp_state[0]
-    n_coords = len(_mp_state[5])
-    chunk_stop = min(n_coords, chunk+chunk_size)
-    return _grand_loop_inner(*_mp_state[1:], start=chunk, stop=chunk_stop)
+def _grid_coords(cvec_s):
+    """(n**3, 3) C-contiguous array with the points of the cvec_s grid
 
-@contextmanager
-def multiproc_state(*args): #chunk_size, confidence, image_stack, angles, coords, experiment):
-    # save = ( chunk_size,
-    #          confidence,
-    #          image_stack,
-    #          angles,
-    #          coords,
-    #          experiment )
-    global _mp_state
-    _mp_state = args
-    yield
-    del(_mp_state)
+    same order as stacking the flattened np.meshgrid(cvec_s, cvec_s, cvec_s)
+    (z fastest, then x, then y), filled in place by broadcasting instead of
+    materializing the three meshgrid arrays and their flattened copies
+    """
+    n = len(cvec_s)
+    test_crds = np.empty((n, n, n, 3))
+    test_crds[..., 0] = cvec_s[np.newaxis, :, np.newaxis]
+    test_crds[..., 1] = cvec_s[:, np.newaxis, np.newaxis]
+    test_crds[..., 2] = cvec_s[np.newaxis, np.newaxis, :]
+
+    return test_crds.reshape(-1, 3)
 
 
 def test_orientations(image_stack, grain_params, experiment,
@@ -802,8 +1160,7 @@ def test_orientations(image_stack, grain_params, experiment,
     # test grid
     # cvec_s = 0.001 * np.arange(-250, 251)[::5]
     cvec_s = np.linspace(-0.25, 0.25, 101)
-    Xs, Ys, Zs = np.meshgrid(cvec_s, cvec_s, cvec_s)
-    test_crds = np.vstack([Xs.flatten(), Ys.flatten(), Zs.flatten()]).T
+    test_crds = _grid_coords(cvec_s)
 
     # compute required dilation
 
@@ -820,17 +1177,24 @@ def evaluate_diffraction_angles(experiment , controller=None):
                             len(experiment.exp_maps))
     all_angles = []
     ref_gparams = np.array([0., 0., 0., 1., 1., 1., 0., 0., 0.])
+    # grains with the same orientation get the same angles; simulate once
+    angles_cache = {}
     for i, exp_map in enumerate(experiment.exp_maps):
-        gparams = np.hstack([exp_map, ref_gparams])
-        sim_results = xrdutil.simulateGVecs(experiment.plane_data,
-                                            experiment.detector_params,
-                                            gparams,
-                                            panel_dims=panel_dims_expanded,
-                                            pixel_pitch=experiment.pixel_size,
-                                            ome_range=experiment.ome_range,
-                                            ome_period=experiment.ome_period,
-                                            distortion=None)
-        all_angles.append(sim_results[2])
+        key = np.asarray(exp_map, dtype=float).tobytes()
+        try:
+            all_angles.append(angles_cache[key])
+        except KeyError:
+            gparams = np.hstack([exp_map, ref_gparams])
+            sim_results = xrdutil.simulateGVecs(experiment.plane_data,
+                                                experiment.detector_params,
+                                                gparams,
+                                                panel_dims=panel_dims_expanded,
+                                                pixel_pitch=experiment.pixel_size,
+                                                ome_range=experiment.ome_range,
+                                                ome_period=experiment.ome_period,
+                                                distortion=None)
+            angles_cache[key] = sim_results[2]
+            all_angles.append(sim_results[2])
         controller.update(i+1)
         pass
     controller.finish(subprocess)
@@ -838,45 +1202,22 @@ def evaluate_diffraction_angles(experiment , controller=None):
     return all_angles
 
 
-@numba.jit
-def _check_with_dilation(image_stack,
-                         frame_index, row_index, col_index,
-                         row_dilation, col_dilation, nrows, ncols):
-    min_row = max(row_index-row_dilation, 0)
-    max_row = min(row_index+row_dilation + 1, nrows)
-    min_col = max(col_index-col_dilation, 0)
-    max_col = min(col_index+col_dilation + 1, ncols)
-
-    for r in range(min_row, max_row):
-        for c in range(min_col, max_col):
-            if image_stack[frame_index, r, c]:
-                return 1.0 # found, win!
-    return 0.0 # not found, lose!
-
+@numba.njit(inline='always')
+def _packed_pixel(image_packed, frame, row, col):
+    """pixel (frame, row, col) of an image stack bit-packed along columns"""
+    return (image_packed[frame, row, col >> 3] >> (7 - (col & 7))) & 1
 
-@numba.jit
-def _confidence_check(image_stack,
-                      frame_indices, row_indices, col_indices,
-                      row_dilation, col_dilation, nrows, ncols):
-    count = len(frame_indices)
-    acc_confidence = 0.0
-    for current in range(count):
-        val = _check_with_dilation(image_stack, frame_indices[current],
-                                   row_indices[current], col_indices[current],
-                                   row_dilation, col_dilation, nrows, ncols)
-        acc_confidence += val
 
-    return acc_confidence/float(count)
-
-@numba.jit
+@numba.njit(cache=True)
 def _confidence_check_dilated(image_stack_dilated,
                               frame_indices, row_indices, col_indices):
     count = len(frame_indices)
     acc_confidence = 0.0
     for current in range(count):
-        acc_confidence += image_stack_dilated[frame_indices[current],
-                                              row_indices[current],
-                                              col_indices[current]]
+        acc_confidence += _packed_pixel(image_stack_dilated,
+                                        frame_indices[current],
+                                        row_indices[current],
+                                        col_indices[current])
 
     return acc_confidence/float(count)
 
@@ -922,12 +1263,15 @@ def _quant_and_clip(coords, angles, base, inv_deltas, clip_vals):
 
     return a[:curr,:]
 
-@numba.njit
-def _quant_and_clip_confidence(coords, angles, image, base, inv_deltas, clip_vals):
+@numba.njit(cache=True)
+def _quant_and_clip_confidence_numba(coords, angles, image,
+                                     base, inv_deltas, clip_vals):
     """quantize and clip the parametric coordinates in coords + angles
 
     coords - (..., 2) array: input 2d parametric coordinates
     angles - (...) array: additional dimension for coordinates
+    image  - (nframes, nrows, (ncols+7)//8) array: image stack bit-packed
+             along the columns, as built by _dilate_image_stack
     base   - (3,) array: base value for quantization (for each dimension)
     inv_deltas - (3,) array: inverse of the quantum size (for each dimension)
     clip_vals - (2,) array: clip size (only applied to coords dimensions)
@@ -963,10 +1307,51 @@ def _quant_and_clip_confidence(coords, angles, image, base, inv_deltas, clip_val
         zf = np.floor((angles[i] - base[2]) * inv_deltas[2])
 
         in_sensor += 1
-        matches += image[int(zf), int(yf), int(xf)]
+        matches += _packed_pixel(image, int(zf), int(yf), int(xf))
 
     return 0 if in_sensor == 0 else float(matches)/float(in_sensor)
 
+
+def _quant_and_clip_confidence_numpy(coords, angles, image,
+                                     base, inv_deltas, clip_vals):
+    """vectorized version of _quant_and_clip_confidence_numba
+
+    same arguments and result. The quantization and the clip mask are built
+    for all the coordinates at once and the image is read with a single
+    gather. Clipped out entries are redirected to pixel (0, 0, 0) and masked
+    off the sum instead of being compacted away.
+    """
+    # nan coordinates fail all the comparisons, so they are clipped out
+    with np.errstate(invalid='ignore'):
+        xf = np.floor((coords[:, 0] - base[0]) * inv_deltas[0])
+        yf = np.floor((coords[:, 1] - base[1]) * inv_deltas[1])
+        in_clip = ((xf >= 0.0) & (xf < clip_vals[0]) &
+                   (yf >= 0.0) & (yf < clip_vals[1]))
+
+    in_sensor = np.count_nonzero(in_clip)
+    if in_sensor == 0:
+        return 0
+
+    zf = np.floor((angles - base[2]) * inv_deltas[2])
+    xi = np.where(in_clip, xf, 0.0).astype(np.intp)
+    yi = np.where(in_clip, yf, 0.0).astype(np.intp)
+    zi = np.where(in_clip, zf, 0.0).astype(np.intp)
+    packed = image[zi, yi, xi >> 3]
+    matches = ((packed >> (7 - (xi & 7))) & in_clip).sum()
+
+    return float(matches)/float(in_sensor)
+
+
+# the numpy version does the clipping and the image gather in whole-array
+# operations, which beats the element loop for the per-(grain, coord) calls
+# in _grand_loop_inner_distorted. Set to True to fall back to the numba loop.
+QUANT_CLIP_USE_NUMBA = False
+
+if QUANT_CLIP_USE_NUMBA:
+    _quant_and_clip_confidence = _quant_and_clip_confidence_numba
+else:
+    _quant_and_clip_confidence = _quant_and_clip_confidence_numpy
+
 # ==============================================================================
 # %% SCRIPT ENTRY AND PARAMETER HANDLING
 # ==============================================================================
@@ -982,12 +1367,8 @@ def main(args, controller):
 
 
 def parse_args():
-    try:
-        default_ncpus = multiprocessing.cpu_count()
-    except NotImplementedError:
-        default_ncpus = 1
-
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(
+        epilog="the number of numba threads is set with NUMBA_NUM_THREADS")
     parser.add_argument("--inst-profile", action='append',
                         help="instrumented profile")
     parser.add_argument("--generate",
@@ -996,13 +1377,11 @@ def parse_args():
                         help="check against an file with intermediate results")
     parser.add_argument("--limit", type=int,
                         help="limit the size of the run")
-    parser.add_argument("--ncpus", type=int, default=default_ncpus,
-                        help="number of processes to use")
     parser.add_argument("--chunk-size", type=int, default=100,
-                        help="chunk size for use in multiprocessing/reporting")
+                        help="chunk size for progress reporting")
     args = parser.parse_args()
 
-    keys = ['inst_profile', 'generate', 'check', 'limit', 'ncpus', 'chunk_size']
+    keys = ['inst_profile', 'generate', 'check', 'limit', 'chunk_size']
 
     print('\n'.join([': '.join([key, str(getattr(args, key))]) for key in keys]))
 
@@ -1026,7 +1405,7 @@ def build_controller(args):
         result_handler = forgetful_result_handler()
 
     controller = ProcessController(result_handler, progress_handler,
-                                   ncpus=args.ncpus, chunk_size=args.chunk_size)
+                                   chunk_size=args.chunk_size)
     if args.limit is not None:
         controller.set_limit('coords', lambda x: min(x, args.limit))
 
@@ -105,7 +105,9 @@ def makeGVector(hkl, bMat):
 
 
 if USE_NUMBA:
-    @numba.njit
+    # fastmath lets LLVM merge the sin/cos pairs of the same argument into
+    # single sincos calls
+    @numba.njit(fastmath=True)
     def _anglesToGVecHelper(angs, out):
         #gVec_e = np.vstack([[np.cos(0.5*angs[:, 0]) * np.cos(angs[:, 1])],
         #                    [np.cos(0.5*angs[:, 0]) * np.sin(angs[:, 1])],
@@ -190,8 +192,10 @@ def gvecToDetectorXY(gVec_c,
 
         # initialize diffracted beam vector array
         dVec_l = np.empty((3, npts))
+        brMat = np.empty((3, 3))
         for ipt in range(npts):
-            dVec_l[:, ipt] = np.dot(makeBinaryRotMat(adm_gVec_l[:, ipt]), -bHat_l).squeeze()
+            makeBinaryRotMat(adm_gVec_l[:, ipt], out=brMat)
+            dVec_l[:, ipt] = np.dot(brMat, -bHat_l).squeeze()
             pass
 
         # ###############################################################
@@ -399,18 +403,14 @@ def oscillAnglesOfHKLs(hkls, chi, rMat_c, bMat, wavelength,
 
         numGood_s  = sum(goodOnes_s)
         numGood    = 2 * numGood_s
-        tmp_eta    = np.empty(numGood)
         tmp_gvec   = np.tile(gHat_c, (1, 2))[:, goodOnes]
         allome     = np.hstack([ome0, ome1])
 
-        for i in range(numGood):
-            rMat_s = makeOscillRotMat([chi, allome[goodOnes][i]])
-    	    gVec_e = np.dot(rMat_e.T,
-                np.dot(rMat_s,
-                       np.dot(rMat_c, tmp_gvec[:, i].reshape(3, 1)
-                       ) ) )
-            tmp_eta[i] = np.arctan2(gVec_e[1], gVec_e[0])
-            pass
+        # all sample rotations for the feasible omegas in one shot
+        rMat_ss = makeOscillRotMatArray(chi, allome[goodOnes])
+        tmp_gvec_s = np.einsum('ijk,ki->ji', rMat_ss, np.dot(rMat_c, tmp_gvec))
+        gVec_e = np.dot(rMat_e.T, tmp_gvec_s)
+        tmp_eta = np.arctan2(gVec_e[1], gVec_e[0])
         eta0[goodOnes_s] = tmp_eta[:numGood_s]
         eta1[goodOnes_s] = tmp_eta[numGood_s:]
 
@@ -824,90 +824,281 @@ else: # not USE_NUMBA
          return nrma
 
 
-def makeDetectorRotMat(tiltAngles):
+def _vec3Components(v):
+    """
+    the three components of a 3-vector given either as an ndarray of any
+    shape holding 3 elements, e.g. (3,) or (3, 1), or as a flat sequence
+    """
+    if isinstance(v, np.ndarray):
+        assert v.size == 3, 'input does not have 3 components'
+        return v.flat[0], v.flat[1], v.flat[2]
+    assert len(v) == 3, 'input does not have 3 components'
+    return v[0], v[1], v[2]
+
+
+def makeDetectorRotMat(tiltAngles, out=None):
     """
     Form the (3, 3) tilt rotations from the tilt angle list:
 
     tiltAngles = [gamma_Xl, gamma_Yl, gamma_Zl] in radians
+
+    also accepts an (n, 3) array of tilt angle triplets, in which case an
+    (n, 3, 3) stack of rotation matrices is returned.
+
+    the product rotZl * rotYl * rotXl is written out in closed form; pass
+    an array of the output shape as 'out' to reuse it instead of allocating
     """
-    # form rMat_d from parameter list
-    cos_gX = np.cos(tiltAngles[0]); sin_gX = np.sin(tiltAngles[0])
-    cos_gY = np.cos(tiltAngles[1]); sin_gY = np.sin(tiltAngles[1])
-    cos_gZ = np.cos(tiltAngles[2]); sin_gZ = np.sin(tiltAngles[2])
-    rotXl = np.array([[     1.,      0.,      0.],
-                      [     0.,  cos_gX, -sin_gX],
-                      [     0.,  sin_gX,  cos_gX]])
-    rotYl = np.array([[ cos_gY,      0.,  sin_gY],
-                      [     0.,      1.,      0.],
-                      [-sin_gY,      0.,  cos_gY]])
-    rotZl = np.array([[ cos_gZ, -sin_gZ,      0.],
-                      [ sin_gZ,  cos_gZ,      0.],
-                      [     0.,      0.,      1.]])
-    return np.dot(rotZl, np.dot(rotYl, rotXl))
-
-
-def makeOscillRotMat(oscillAngles):
+    tiltAngles = np.asarray(tiltAngles, dtype=float)
+    cos_gX = np.cos(tiltAngles[..., 0]); sin_gX = np.sin(tiltAngles[..., 0])
+    cos_gY = np.cos(tiltAngles[..., 1]); sin_gY = np.sin(tiltAngles[..., 1])
+    cos_gZ = np.cos(tiltAngles[..., 2]); sin_gZ = np.sin(tiltAngles[..., 2])
+
+    rMat = np.empty(tiltAngles.shape[:-1] + (3, 3)) if out is None else out
+    rMat[..., 0, 0] =  cos_gZ*cos_gY
+    rMat[..., 0, 1] =  cos_gZ*sin_gY*sin_gX - sin_gZ*cos_gX
+    rMat[..., 0, 2] =  cos_gZ*sin_gY*cos_gX + sin_gZ*sin_gX
+    rMat[..., 1, 0] =  sin_gZ*cos_gY
+    rMat[..., 1, 1] =  sin_gZ*sin_gY*sin_gX + cos_gZ*cos_gX
+    rMat[..., 1, 2] =  sin_gZ*sin_gY*cos_gX - cos_gZ*sin_gX
+    rMat[..., 2, 0] = -sin_gY
+    rMat[..., 2, 1] =  cos_gY*sin_gX
+    rMat[..., 2, 2] =  cos_gY*cos_gX
+    return rMat
+
+
+def makeOscillRotMat(oscillAngles, out=None):
     """
     oscillAngles = [chi, ome]
+
+    also accepts an (n, 2) array of [chi, ome] pairs, in which case an
+    (n, 3, 3) stack of rotation matrices is returned.
+
+    the product rchi * rome is written out in closed form; pass an array of
+    the output shape as 'out' to reuse it instead of allocating
     """
-    cchi = np.cos(oscillAngles[0]); schi = np.sin(oscillAngles[0])
-    come = np.cos(oscillAngles[1]); some = np.sin(oscillAngles[1])
-    rchi = np.array([[   1.,    0.,    0.],
-                     [   0.,  cchi, -schi],
-                     [   0.,  schi,  cchi]])
-    rome = np.array([[ come,    0.,  some],
-                     [   0.,    1.,    0.],
-                     [-some,    0.,  come]])
-    return np.dot(rchi, rome)
-
-
-def makeRotMatOfExpMap(expMap):
+    oscillAngles = np.asarray(oscillAngles, dtype=float)
+    cchi = np.cos(oscillAngles[..., 0]); schi = np.sin(oscillAngles[..., 0])
+    come = np.cos(oscillAngles[..., 1]); some = np.sin(oscillAngles[..., 1])
+
+    rMat = np.empty(oscillAngles.shape[:-1] + (3, 3)) if out is None else out
+    rMat[..., 0, 0] =  come
+    rMat[..., 0, 1] =  0.
+    rMat[..., 0, 2] =  some
+    rMat[..., 1, 0] =  schi*some
+    rMat[..., 1, 1] =  cchi
+    rMat[..., 1, 2] = -schi*come
+    rMat[..., 2, 0] = -cchi*some
+    rMat[..., 2, 1] =  schi
+    rMat[..., 2, 2] =  cchi*come
+    return rMat
+
+
+def makeOscillRotMatArray(chi, omeArray, out=None):
     """
+    Applies makeOscillRotMat for one chi value and an array of omega
+    values, returning an (n, 3, 3) stack; the chi terms are evaluated once
+    for the whole sweep.  'out' may be given to reuse an (n, 3, 3) array.
     """
-    expMap = np.asarray(expMap).flatten()
-    phi = np.sqrt(expMap[0]*expMap[0] + expMap[1]*expMap[1] + expMap[2]*expMap[2])
-    if phi > epsf:
-        wMat = np.array([[        0., -expMap[2],  expMap[1]],
-                         [ expMap[2],         0., -expMap[0]],
-    	                 [-expMap[1],  expMap[0],         0.]])
-    	rMat = \
-          I3 \
-          + ( np.sin(phi) / phi ) * wMat \
-          + ( (1. - np.cos(phi)) / (phi*phi) ) * np.dot(wMat, wMat)
-    else:
-    	rMat = I3
+    omeArray = np.asarray(omeArray, dtype=float).flatten()
+    cchi = np.cos(chi); schi = np.sin(chi)
+    come = np.cos(omeArray); some = np.sin(omeArray)
+
+    rMat = np.empty((len(omeArray), 3, 3)) if out is None else out
+    rMat[:, 0, 0] =  come
+    rMat[:, 0, 1] =  0.
+    rMat[:, 0, 2] =  some
+    rMat[:, 1, 0] =  schi*some
+    rMat[:, 1, 1] =  cchi
+    rMat[:, 1, 2] = -schi*come
+    rMat[:, 2, 0] = -cchi*some
+    rMat[:, 2, 1] =  schi
+    rMat[:, 2, 2] =  cchi*come
     return rMat
 
 
-def makeBinaryRotMat(axis):
+# The constructors here all return proper rotations, whose inverse is the
+# transpose; never call np.linalg.inv on their output.  These return the
+# inverse as a (zero-copy) transposed view alongside the rotation itself.
+
+def makeDetectorRotMatWithInverse(tiltAngles):
+    """
+    returns (rMat_d, rMat_d.T) for makeDetectorRotMat(tiltAngles)
+    """
+    rMat = makeDetectorRotMat(tiltAngles)
+    return rMat, np.swapaxes(rMat, -1, -2)
+
+
+def makeOscillRotMatWithInverse(oscillAngles):
+    """
+    returns (rMat_s, rMat_s.T) for makeOscillRotMat(oscillAngles)
+    """
+    rMat = makeOscillRotMat(oscillAngles)
+    return rMat, np.swapaxes(rMat, -1, -2)
+
+
+if USE_NUMBA:
+    @numba.njit(fastmath=True)
+    def _makeRotMatOfExpMapSingle(e0, e1, e2, out):
+        # Rodrigues formula written out element-wise:
+        #   R = I + sin(phi)/phi * W + (1 - cos(phi))/phi**2 * W^2
+        # with W the skew matrix of expMap and W^2 = e e^T - phi**2 I
+        phi2 = e0*e0 + e1*e1 + e2*e2
+        if phi2 > epsf*epsf:
+            phi = np.sqrt(phi2)
+            a = np.sin(phi) / phi
+            b = (1. - np.cos(phi)) / phi2
+            out[0, 0] = 1. + b*(e0*e0 - phi2)
+            out[0, 1] = -a*e2 + b*e0*e1
+            out[0, 2] =  a*e1 + b*e0*e2
+            out[1, 0] =  a*e2 + b*e1*e0
+            out[1, 1] = 1. + b*(e1*e1 - phi2)
+            out[1, 2] = -a*e0 + b*e1*e2
+            out[2, 0] = -a*e1 + b*e2*e0
+            out[2, 1] =  a*e0 + b*e2*e1
+            out[2, 2] = 1. + b*(e2*e2 - phi2)
+        else:
+            for i in range(3):
+                for j in range(3):
+                    out[i, j] = 0.
+                out[i, i] = 1.
+
+    @numba.njit(parallel=True, fastmath=True)
+    def _makeRotMatOfExpMapMulti(expMaps, out):
+        n = expMaps.shape[0]
+        for i in numba.prange(n):
+            _makeRotMatOfExpMapSingle(expMaps[i, 0], expMaps[i, 1],
+                                      expMaps[i, 2], out[i])
+
+
+    def makeRotMatOfExpMap(expMap, out=None):
+        """
+        (3, 3) rotation matrix of an exponential map (angle * unit axis)
+
+        'out' may be given to reuse a (3, 3) array
+        """
+        e0, e1, e2 = _vec3Components(expMap)
+        result = np.empty((3, 3)) if out is None else out
+        _makeRotMatOfExpMapSingle(e0, e1, e2, result)
+        return result
+
+
+    def makeRotMatOfExpMapArray(expMaps):
+        """
+        (n, 3, 3) rotation matrices of an (n, 3) array of exponential maps
+        """
+        expMaps = np.ascontiguousarray(expMaps, dtype=float).reshape(-1, 3)
+        result = np.empty((len(expMaps), 3, 3))
+        _makeRotMatOfExpMapMulti(expMaps, result)
+        return result
+
+else: # not USE_NUMBA
+    def makeRotMatOfExpMap(expMap, out=None):
+        """
+        (3, 3) rotation matrix of an exponential map (angle * unit axis)
+
+        'out' may be given to reuse a (3, 3) array
+        """
+        result = makeRotMatOfExpMapArray(expMap)[0]
+        if out is None:
+            return result
+        out[...] = result
+        return out
+
+
+    def makeRotMatOfExpMapArray(expMaps):
+        """
+        (n, 3, 3) rotation matrices of an (n, 3) array of exponential maps
+        """
+        expMaps = np.asarray(expMaps, dtype=float).reshape(-1, 3)
+        e0 = expMaps[:, 0]; e1 = expMaps[:, 1]; e2 = expMaps[:, 2]
+        phi2 = e0*e0 + e1*e1 + e2*e2
+        phi = np.sqrt(phi2)
+
+        # identity for vanishing angles
+        nonzero = phi > epsf
+        a = np.zeros_like(phi)
+        b = np.zeros_like(phi)
+        a[nonzero] = np.sin(phi[nonzero]) / phi[nonzero]
+        b[nonzero] = (1. - np.cos(phi[nonzero])) / phi2[nonzero]
+
+        rMat = np.empty((len(expMaps), 3, 3))
+        rMat[:, 0, 0] = 1. + b*(e0*e0 - phi2)
+        rMat[:, 0, 1] = -a*e2 + b*e0*e1
+        rMat[:, 0, 2] =  a*e1 + b*e0*e2
+        rMat[:, 1, 0] =  a*e2 + b*e1*e0
+        rMat[:, 1, 1] = 1. + b*(e1*e1 - phi2)
+        rMat[:, 1, 2] = -a*e0 + b*e1*e2
+        rMat[:, 2, 0] = -a*e1 + b*e2*e0
+        rMat[:, 2, 1] =  a*e0 + b*e2*e1
+        rMat[:, 2, 2] = 1. + b*(e2*e2 - phi2)
+        return rMat
+
+
+def makeRotMatOfExpMapInverse(expMap, out=None):
     """
+    inverse of makeRotMatOfExpMap(expMap), i.e. its transpose, which is the
+    rotation of the negated exponential map
     """
-    n = np.asarray(axis).flatten()
-    assert len(n) == 3, 'Axis input does not have 3 components'
-    return 2*np.dot(n.reshape(3, 1), n.reshape(1, 3)) - I3
+    e0, e1, e2 = _vec3Components(expMap)
+    return makeRotMatOfExpMap((-e0, -e1, -e2), out=out)
 
 
 if USE_NUMBA:
     @numba.njit
-    def _makeEtaFrameRotMat(bHat_l, eHat_l, out):
+    def _makeBinaryRotMat(n0, n1, n2, out):
+        # 2 * n n^T - I written out; symmetric, so 6 unique entries
+        out[0, 0] = 2.*n0*n0 - 1.
+        out[1, 1] = 2.*n1*n1 - 1.
+        out[2, 2] = 2.*n2*n2 - 1.
+        out[0, 1] = out[1, 0] = 2.*n0*n1
+        out[0, 2] = out[2, 0] = 2.*n0*n2
+        out[1, 2] = out[2, 1] = 2.*n1*n2
+
+
+    def makeBinaryRotMat(axis, out=None):
+        """
+        """
+        n0, n1, n2 = _vec3Components(axis)
+        result = np.empty((3, 3)) if out is None else out
+        _makeBinaryRotMat(n0, n1, n2, result)
+        return result
+
+else: # not USE_NUMBA
+    def makeBinaryRotMat(axis, out=None):
+        """
+        """
+        n0, n1, n2 = _vec3Components(axis)
+        result = np.array([[2.*n0*n0 - 1.,      2.*n0*n1,      2.*n0*n2],
+                           [     2.*n0*n1, 2.*n1*n1 - 1.,      2.*n1*n2],
+                           [     2.*n0*n2,      2.*n1*n2, 2.*n2*n2 - 1.]])
+        if out is None:
+            return result
+        out[...] = result
+        return out
+
+
+if USE_NUMBA:
+    @numba.njit(fastmath=True)
+    def _makeEtaFrameRotMat(b0, b1, b2, e0, e1, e2, out):
         # bHat_l and eHat_l CANNOT have 0 magnitude!
         # must catch this case as well as colinear bHat_l/eHat_l elsewhere...
-        bHat_mag = np.sqrt(bHat_l[0]**2 + bHat_l[1]**2 + bHat_l[2]**2)
-        
+        inv_bHat_mag = 1. / np.sqrt(b0**2 + b1**2 + b2**2)
+
         # assign Ze as -bHat_l
-        for i in range(3):
-            out[i, 2] = -bHat_l[i] / bHat_mag
+        out[0, 2] = -b0 * inv_bHat_mag
+        out[1, 2] = -b1 * inv_bHat_mag
+        out[2, 2] = -b2 * inv_bHat_mag
 
         # find Ye as Ze ^ eHat_l
-        Ye0 = out[1, 2]*eHat_l[2] - eHat_l[1]*out[2, 2]
-        Ye1 = out[2, 2]*eHat_l[0] - eHat_l[2]*out[0, 2]
-        Ye2 = out[0, 2]*eHat_l[1] - eHat_l[0]*out[1, 2]
+        Ye0 = out[1, 2]*e2 - e1*out[2, 2]
+        Ye1 = out[2, 2]*e0 - e2*out[0, 2]
+        Ye2 = out[0, 2]*e1 - e0*out[1, 2]
 
-        Ye_mag = np.sqrt(Ye0**2 + Ye1**2 + Ye2**2)
+        inv_Ye_mag = 1. / np.sqrt(Ye0**2 + Ye1**2 + Ye2**2)
 
-        out[0, 1] = Ye0 / Ye_mag
-        out[1, 1] = Ye1 / Ye_mag
-        out[2, 1] = Ye2 / Ye_mag
+        out[0, 1] = Ye0 * inv_Ye_mag
+        out[1, 1] = Ye1 * inv_Ye_mag
+        out[2, 1] = Ye2 * inv_Ye_mag
 
         # find Xe as Ye ^ Ze
         out[0, 0] = out[1, 1]*out[2, 2] - out[1, 2]*out[2, 1]
@@ -915,26 +1106,32 @@ if USE_NUMBA:
         out[2, 0] = out[0, 1]*out[1, 2] - out[0, 2]*out[1, 1]
 
 
-    def makeEtaFrameRotMat(bHat_l, eHat_l):
+    def makeEtaFrameRotMat(bHat_l, eHat_l, out=None):
         """
         make eta basis COB matrix with beam antiparallel with Z
 
         takes components from ETA frame to LAB
 
+        'out' may be given to reuse a (3, 3) array
+
         **NO EXCEPTION HANDLING FOR COLINEAR ARGS IN NUMBA VERSION!
 
         ...put checks for non-zero magnitudes and non-colinearity in wrapper?
         """
-        result = np.empty((3,3))
-        _makeEtaFrameRotMat(bHat_l.reshape(3), eHat_l.reshape(3), result)
+        result = np.empty((3,3)) if out is None else out
+        b0, b1, b2 = _vec3Components(bHat_l)
+        e0, e1, e2 = _vec3Components(eHat_l)
+        _makeEtaFrameRotMat(b0, b1, b2, e0, e1, e2, result)
         return result
 
 else: # not USE_NUMBA
-    def makeEtaFrameRotMat(bHat_l, eHat_l):
+    def makeEtaFrameRotMat(bHat_l, eHat_l, out=None):
         """
         make eta basis COB matrix with beam antiparallel with Z
         
         takes components from ETA frame to LAB
+
+        'out' may be given to reuse a (3, 3) array
         """
         # normalize input 
         bHat_l = unitVector(bHat_l.reshape(3, 1))
@@ -948,7 +1145,11 @@ else: # not USE_NUMBA
         
         # find Xe as cross(bHat_l, Ye)
         Xe = np.cross(bHat_l.flatten(), Ye.flatten()).reshape(3, 1)
-        return np.hstack([Xe, Ye, -bHat_l])
+        result = np.hstack([Xe, Ye, -bHat_l])
+        if out is None:
+            return result
+        out[...] = result
+        return out
 
 
 def validateAngleRanges(angList, startAngs, stopAngs, ccw=True):
@@ -967,15 +1168,6 @@ def validateAngleRanges(angList, startAngs, stopAngs, ccw=True):
     n_ranges = len(startAngs)
     assert len(stopAngs) == n_ranges, "length of min and max angular limits must match!"
 
-    # to avoid warnings in >=, <= later down, mark nans;
-    # need these to trick output to False in the case of nan input
-    nan_mask = np.isnan(angList)
-
-    reflInRange = np.zeros(angList.shape, dtype=bool)
-
-    # anonynmous func for zProjection
-    zProj = lambda x, y: np.cos(x) * np.sin(y) - np.sin(x) * np.cos(y)
-
     # bin length for chunking
     binLen = np.pi / 2.
 
@@ -989,9 +1181,8 @@ def validateAngleRanges(angList, startAngs, stopAngs, ccw=True):
         # ambiguous case
         raise RuntimeError, "Improper usage; at least one of your ranges is alread 360 degrees!"
     elif dp[0] >= 1. - sqrt_epsf and n_ranges == 1:
-        # trivial case!
-        reflInRange = np.ones(angList.shape, dtype=bool)
-        reflInRange[nan_mask] = False
+        # trivial case! only nan input is out of range
+        reflInRange = ~np.isnan(angList)
     else:
         # solve for arc lengths
         # ...note: no zeros should have made it here
@@ -1008,89 +1199,160 @@ def validateAngleRanges(angList, startAngs, stopAngs, ccw=True):
         if sum(arclen) > 2*np.pi:
             raise RuntimeWarning, "Specified angle ranges sum to > 360 degrees, which is suspect..."
 
-        # check that there are no more thandp = np.zeros(n_ranges)
+        # collect the subrange edges of all ranges so the z-projections
+        # below take a single pass over angList
+        startEdges = []
+        stopEdges  = []
+        # if clockwise, negate bin lengths; the sign is fixed for all ranges
+        sense = 1. if ccw else -1.
         for i in range(n_ranges):
-            # number or subranges using 'binLen'
+            # number or subranges using 'binLen'; the final one takes the
+            # remainder, or a full bin if the arc divides evenly
             numSubranges = int(np.ceil(arclen[i]/binLen))
-
-            # check remaider
-            binrem = np.remainder(arclen[i], binLen)
-            if binrem == 0:
-                finalBinLen = binLen
-            else:
-                finalBinLen = binrem
-
-            # if clockwise, negate bin length
-            if not ccw:
-                 binLen      = -binLen
-                 finalBinLen = -finalBinLen
+            finalBinLen = arclen[i] - binLen*(numSubranges - 1)
 
             # Create sub ranges on the fly to avoid ambiguity in dot product
             # for wedges >= 180 degrees
-            subRanges = np.array(\
-                [startAngs[i] + binLen*j for j in range(numSubranges)] + \
-                    [startAngs[i] + binLen*(numSubranges - 1) + finalBinLen])
-
-            for k in range(numSubranges):
-                zStart = zProj(angList, subRanges[k])
-                zStop  = zProj(angList, subRanges[k + 1])
-                if ccw:
-                    zStart[nan_mask] =  999.
-                    zStop[nan_mask]  = -999.
-                    reflInRange = reflInRange | np.logical_and(zStart <= 0, zStop >= 0)
-                else:
-                    zStart[nan_mask] = -999.
-                    zStop[nan_mask]  =  999.
-                    reflInRange = reflInRange | np.logical_and(zStart >= 0, zStop <= 0)
+            subRanges = startAngs[i] + sense*binLen*np.arange(numSubranges + 1.)
+            subRanges[-1] = startAngs[i] + sense*(binLen*(numSubranges - 1) + finalBinLen)
+            startEdges.append(subRanges[:-1])
+            stopEdges.append(subRanges[1:])
+        startEdges = np.hstack(startEdges)
+        stopEdges  = np.hstack(stopEdges)
+
+        # z-projections of every angle onto every subrange edge, (n, m)
+        cosAng = np.cos(angList)[:, np.newaxis]
+        sinAng = np.sin(angList)[:, np.newaxis]
+        zStart = cosAng * np.sin(startEdges) - sinAng * np.cos(startEdges)
+        zStop  = cosAng * np.sin(stopEdges)  - sinAng * np.cos(stopEdges)
+
+        # nan input compares False in both tests, so no masking is needed;
+        # only the invalid-value warnings need silencing
+        with np.errstate(invalid='ignore'):
+            if ccw:
+                inSubrange = np.logical_and(zStart <= 0, zStop >= 0)
+            else:
+                inSubrange = np.logical_and(zStart >= 0, zStop <= 0)
+        reflInRange = np.any(inSubrange, axis=1)
     return reflInRange
 
 
-def rotate_vecs_about_axis(angle, axis, vecs):
-    """
-    Rotate vectors about an axis
+if USE_NUMBA:
+    @numba.njit(parallel=True, fastmath=True)
+    def _rotate_vecs_about_axis(angle, axis, vecs, out):
+        # v_rot = v + 2*q0*cross(q, v) + 2*cross(q, cross(q, v)), evaluated
+        # column by column so no temporaries the size of vecs are needed
+        n = vecs.shape[1]
+        for i in numba.prange(n):
+            q0 = np.cos(0.5*angle[i])
+            q1 = np.sin(0.5*angle[i])
+            qx = q1*axis[0, i]; qy = q1*axis[1, i]; qz = q1*axis[2, i]
+            vx = vecs[0, i];    vy = vecs[1, i];    vz = vecs[2, i]
+
+            tx = qy*vz - qz*vy
+            ty = qz*vx - qx*vz
+            tz = qx*vy - qy*vx
+
+            out[0, i] = vx + 2.*q0*tx + 2.*(qy*tz - qz*ty)
+            out[1, i] = vy + 2.*q0*ty + 2.*(qz*tx - qx*tz)
+            out[2, i] = vz + 2.*q0*tz + 2.*(qx*ty - qy*tx)
+
+
+    def rotate_vecs_about_axis(angle, axis, vecs):
+        """
+        Rotate vectors about an axis
 
-    INPUTS
-    *angle* - array of angles (len == 1 or n)
-    *axis*  - array of unit vectors (shape == (3, 1) or (3, n))
-    *vec*   - array of vectors to be rotated (shape = (3, n))
+        INPUTS
+        *angle* - array of angles (len == 1 or n)
+        *axis*  - array of unit vectors (shape == (3, 1) or (3, n))
+        *vec*   - array of vectors to be rotated (shape = (3, n))
 
-    Quaternion formula:
-    if we split v into parallel and perpedicular components w.r.t. the
-    axis of quaternion q,
+        Quaternion formula:
+        if we split v into parallel and perpedicular components w.r.t. the
+        axis of quaternion q,
 
-        v = a + n
+            v = a + n
 
-    then the action of rotating the vector dot(R(q), v) becomes
+        then the action of rotating the vector dot(R(q), v) becomes
 
-        v_rot = (q0**2 - |q|**2)(a + n) + 2*dot(q, a)*q + 2*q0*cross(q, n)
+            v_rot = (q0**2 - |q|**2)(a + n) + 2*dot(q, a)*q + 2*q0*cross(q, n)
 
-    """
-    angle   = np.atleast_1d(angle)
-    #nvecs   = vecs.shape[1]                  # assume column vecs
-
-    # quaternion components
-    q0 = np.cos(0.5*angle)
-    q1 = np.sin(0.5*angle)
-    qv = np.tile(q1, (3, 1)) * axis
-
-    # component perpendicular to axes (inherits shape of vecs)
-    vp0 = vecs[0, :] - axis[0, :]*axis[0, :]*vecs[0, :] - axis[0, :]*axis[1, :]*vecs[1, :] - axis[0, :]*axis[2, :]*vecs[2, :]
-    vp1 = vecs[1, :] - axis[1, :]*axis[1, :]*vecs[1, :] - axis[1, :]*axis[0, :]*vecs[0, :] - axis[1, :]*axis[2, :]*vecs[2, :]
-    vp2 = vecs[2, :] - axis[2, :]*axis[2, :]*vecs[2, :] - axis[2, :]*axis[0, :]*vecs[0, :] - axis[2, :]*axis[1, :]*vecs[1, :]
-
-    # dot product with components along; cross product with components normal
-    qdota   = \
-      ( axis[0, :]*vecs[0, :] + axis[1, :]*vecs[1, :] + axis[2, :]*vecs[2, :] ) * \
-      ( axis[0, :] * qv[0, :] + axis[1, :] * qv[1, :] + axis[2, :] * qv[2, :] )
-    qcrossn = np.vstack([qv[1, :]*vp2 - qv[2, :]*vp1,
-                         qv[2, :]*vp0 - qv[0, :]*vp2,
-                         qv[0, :]*vp1 - qv[1, :]*vp0])
-
-    # quaternion formula
-    v_rot = np.tile(q0*q0 - q1*q1, (3, 1)) * vecs \
-      + 2. * np.tile(qdota, (3, 1)) * qv \
-      + 2. * np.tile(q0, (3, 1)) * qcrossn
-    return v_rot
+        """
+        n = vecs.shape[1]
+
+        # broadcast angles and axes to one per vector
+        angles = np.empty(n)
+        angles[:] = np.atleast_1d(angle).flatten()
+        axes = np.empty((3, n))
+        axes[:] = axis
+
+        v_rot = np.empty((3, n))
+        _rotate_vecs_about_axis(angles, axes, np.asarray(vecs, dtype=float), v_rot)
+        return v_rot
+
+else: # not USE_NUMBA
+    def rotate_vecs_about_axis(angle, axis, vecs):
+        """
+        Rotate vectors about an axis
+
+        INPUTS
+        *angle* - array of angles (len == 1 or n)
+        *axis*  - array of unit vectors (shape == (3, 1) or (3, n))
+        *vec*   - array of vectors to be rotated (shape = (3, n))
+
+        Quaternion formula:
+        if we split v into parallel and perpedicular components w.r.t. the
+        axis of quaternion q,
+
+            v = a + n
+
+        then the action of rotating the vector dot(R(q), v) becomes
+
+            v_rot = (q0**2 - |q|**2)(a + n) + 2*dot(q, a)*q + 2*q0*cross(q, n)
+
+        """
+        angle   = np.atleast_1d(angle)
+        #nvecs   = vecs.shape[1]                  # assume column vecs
+
+        # quaternion components
+        q0 = np.cos(0.5*angle)
+        q1 = np.sin(0.5*angle)
+        qv = np.tile(q1, (3, 1)) * axis
+
+        # component perpendicular to axes (inherits shape of vecs)
+        vp0 = vecs[0, :] - axis[0, :]*axis[0, :]*vecs[0, :] - axis[0, :]*axis[1, :]*vecs[1, :] - axis[0, :]*axis[2, :]*vecs[2, :]
+        vp1 = vecs[1, :] - axis[1, :]*axis[1, :]*vecs[1, :] - axis[1, :]*axis[0, :]*vecs[0, :] - axis[1, :]*axis[2, :]*vecs[2, :]
+        vp2 = vecs[2, :] - axis[2, :]*axis[2, :]*vecs[2, :] - axis[2, :]*axis[0, :]*vecs[0, :] - axis[2, :]*axis[1, :]*vecs[1, :]
+
+        # dot product with components along; cross product with components normal
+        qdota   = \
+          ( axis[0, :]*vecs[0, :] + axis[1, :]*vecs[1, :] + axis[2, :]*vecs[2, :] ) * \
+          ( axis[0, :] * qv[0, :] + axis[1, :] * qv[1, :] + axis[2, :] * qv[2, :] )
+        qcrossn = np.vstack([qv[1, :]*vp2 - qv[2, :]*vp1,
+                             qv[2, :]*vp0 - qv[0, :]*vp2,
+                             qv[0, :]*vp1 - qv[1, :]*vp0])
+
+        # quaternion formula
+        v_rot = np.tile(q0*q0 - q1*q1, (3, 1)) * vecs \
+          + 2. * np.tile(qdota, (3, 1)) * qv \
+          + 2. * np.tile(q0, (3, 1)) * qcrossn
+        return v_rot
+
+
+# component indices and signs of the quaternion product matrices;
+# qmat[i, j] = sign[i, j] * q[idx[i, j]]
+_qprod_idx = np.array([[0, 1, 2, 3],
+                       [1, 0, 3, 2],
+                       [2, 3, 0, 1],
+                       [3, 2, 1, 0]])
+_qprod_sgn = {'right': np.array([[ 1., -1., -1., -1.],
+                                 [ 1.,  1.,  1., -1.],
+                                 [ 1., -1.,  1.,  1.],
+                                 [ 1.,  1., -1.,  1.]]),
+              'left':  np.array([[ 1., -1., -1., -1.],
+                                 [ 1.,  1., -1.,  1.],
+                                 [ 1.,  1.,  1., -1.],
+                                 [ 1., -1.,  1.,  1.]])}
 
 
 def quat_product_matrix(q, mult='right'):
@@ -1102,7 +1364,7 @@ def quat_product_matrix(q, mult='right'):
 
     INPUTS
         1) quats is (4,), an iterable representing a unit quaternion
-           horizontally concatenated
+           horizontally concatenated, or (4, n) for n quaternions
         2) mult is a keyword arg, either 'left' or 'right', denoting
            the sense of the multiplication:
 
@@ -1112,7 +1374,7 @@ def quat_product_matrix(q, mult='right'):
 
     OUTPUTS
         1) qmat is (4, 4), the left or right quaternion product
-           operator
+           operator, or (n, 4, 4) for (4, n) input
 
     NOTES
        *) This function is intended to replace a cross-product based
@@ -1120,18 +1382,13 @@ def quat_product_matrix(q, mult='right'):
           quaternions (e.g. applying symmetries to a large set of
           orientations).
     """
-    if mult == 'right':
-        qmat = np.array([[ q[0], -q[1], -q[2], -q[3]],
-                         [ q[1],  q[0],  q[3], -q[2]],
-                         [ q[2], -q[3],  q[0],  q[1]],
-                         [ q[3],  q[2], -q[1],  q[0]],
-                         ])
-    elif mult == 'left':
-        qmat = np.array([[ q[0], -q[1], -q[2], -q[3]],
-                         [ q[1],  q[0], -q[3],  q[2]],
-                         [ q[2],  q[3],  q[0], -q[1]],
-                         [ q[3], -q[2],  q[1],  q[0]],
-                         ])
+    if mult not in _qprod_sgn:
+        raise RuntimeError, "mult must be either 'left' or 'right'"
+    q = np.asarray(q)
+    if q.ndim == 1:
+        qmat = _qprod_sgn[mult] * q[_qprod_idx]
+    else:
+        qmat = _qprod_sgn[mult] * q.T[:, _qprod_idx]
     return qmat
 
 
@@ -1139,26 +1396,61 @@ def quat_distance(q1, q2, qsym):
     """
     """
     # qsym from PlaneData objects are (4, nsym)
-    # convert symmetries to (4, 4) qprod matrices
-    nsym = qsym.shape[1]
-    rsym = np.zeros((nsym, 4, 4))
-    for i in range(nsym):
-        rsym[i, :, :] = quat_product_matrix(qsym[:, i], mult='right')
+    #
+    # the symmetrically equivalent q2 are q2 * qsym, and the scalar part
+    # of q1^-1 * (q2 * qsym) is the dot product of q1 with each of them.
+    # Only the largest scalar part is needed for the distance, so neither
+    # the (nsym, 4, 4) symmetry matrices nor the vector parts are formed.
+    q1 = np.asarray(q1, dtype=float).flatten()
+    q2 = np.asarray(q2, dtype=float).flatten()
+
+    # row of the misorientation scalar parts against qsym, (4,)
+    q1_q2 = np.dot(q1, quat_product_matrix(q2, mult='left'))
 
-    # inverse of q1 in matrix form
-    q1i = quat_product_matrix( np.r_[ 1, -1, -1, -1] * np.atleast_1d(q1).flatten(), mult='right' )
+    # find the largest scalar component over the symmetry group
+    q0_max = np.amax(abs(np.dot(q1_q2, qsym)))
 
-    # Do R * Gc, store as vstacked equivalent quaternions (nsym, 4)
-    q2s = np.dot(rsym, q2)
+    return 2 * arccosSafe( q0_max )
 
-    # Calculate the class of misorientations for full symmetrically equivalent
-    # q1 and q2: (4, ) * (4, nsym)
-    eqv_mis = np.dot(q1i, q2s.T)
 
-    # find the largest scalar component
-    q0_max = np.argmax(abs(eqv_mis[0, :]))
+if USE_NUMBA:
+    @numba.njit(parallel=True)
+    def _quat_distance_multi(q1_q2s, qsym, out):
+        n = q1_q2s.shape[1]
+        nsym = qsym.shape[1]
+        for i in numba.prange(n):
+            q0_max = 0.
+            for m in range(nsym):
+                q0 = q1_q2s[0, i]*qsym[0, m] + q1_q2s[1, i]*qsym[1, m] \
+                   + q1_q2s[2, i]*qsym[2, m] + q1_q2s[3, i]*qsym[3, m]
+                if abs(q0) > q0_max:
+                    q0_max = abs(q0)
+            out[i] = q0_max
+
+
+    def quat_distance_array(q1s, q2s, qsym):
+        """
+        misorientation angles between paired (4, n) arrays of quaternions
+        under the symmetry group qsym, (4, nsym)
+        """
+        q1s = np.asarray(q1s, dtype=float).reshape(4, -1)
+        q2s = np.asarray(q2s, dtype=float).reshape(4, -1)
+        q1_q2s = np.ascontiguousarray(
+            np.einsum('jn,njk->kn', q1s, quat_product_matrix(q2s, mult='left')))
+        q0_max = np.empty(q1s.shape[1])
+        _quat_distance_multi(q1_q2s, np.ascontiguousarray(qsym, dtype=float), q0_max)
+        return 2 * arccosSafe(q0_max)
 
-    # compute the distance
-    qmin  = eqv_mis[:, q0_max]
+else: # not USE_NUMBA
+    def quat_distance_array(q1s, q2s, qsym):
+        """
+        misorientation angles between paired (4, n) arrays of quaternions
+        under the symmetry group qsym, (4, nsym)
+        """
+        q1s = np.asarray(q1s, dtype=float).reshape(4, -1)
+        q2s = np.asarray(q2s, dtype=float).reshape(4, -1)
+        q1_q2s = np.einsum('jn,njk->nk', q1s, quat_product_matrix(q2s, mult='left'))
 
-    return 2 * arccosSafe( qmin[0] * np.sign(qmin[0]) )
+        # scalar parts of the misorientations, (n, nsym)
+        q0 = np.dot(q1_q2s, qsym)
+        return 2 * arccosSafe(np.amax(abs(q0), axis=1))